@@ -1,13 +1,17 @@
 import logging
 import os
+import random
 import sys
 import time
-from http import HTTPStatus
+from collections import OrderedDict
 from typing import Dict, List, Union
 
+import orjson
 import requests
 import telegram
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from exceptions import (CheckHomeworksInResponse, CheckHomeworkStatus,
                         CheckStatusEndpoint)
@@ -21,8 +25,15 @@ TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
 
 RETRY_TIME = 600
+MAX_RETRY_TIME = 3600
+RETRY_JITTER = 0.1
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+TIMEOUT = (5, 30)
+MESSAGE_CACHE_SIZE = 128
+MESSAGE_CACHE_TIME = 3600
+MESSAGE_MAX_LENGTH = 4000
+MESSAGE_SEPARATOR = '\n\n'
 
 
 HOMEWORK_STATUSES = {
@@ -30,8 +41,32 @@ HOMEWORK_STATUSES = {
     'reviewing': 'Работа взята на проверку ревьюером.',
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
+VERDICT_TEMPLATES = {
+    status: 'Изменился статус проверки работы "{name}". ' + verdict
+    for status, verdict in HOMEWORK_STATUSES.items()
+}
+
+sent_error_messages = OrderedDict()
+last_api_answer = {}
+
 
-status_all_homeworks = {}
+def init_session() -> requests.Session:
+    """Сессия с keep-alive соединением и повтором временных ошибок API."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(
+        total=3,
+        backoff_factor=1.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True
+    )
+    session.mount('https://', HTTPAdapter(
+        max_retries=retry, pool_connections=1, pool_maxsize=2))
+    return session
+
+
+SESSION = init_session()
 
 
 def init_logger() -> logging.Logger:
@@ -62,18 +97,37 @@ def get_api_answer(current_timestamp: int) -> Dict[str, Union[list, int]]:
     """Запрос к эндпоинту API-сервиса."""
     timestamp = current_timestamp or int(time.time())
     params = {'from_date': timestamp}
+    headers = {}
+    if last_api_answer.get('from_date') == timestamp:
+        headers['If-None-Match'] = last_api_answer['etag']
     try:
-        response = requests.get(ENDPOINT, headers=HEADERS, params=params)
+        response = SESSION.get(
+            ENDPOINT, headers=headers, params=params, timeout=TIMEOUT)
     except Exception as error:
-        raise CheckStatusEndpoint(f'requests.get вернул ошибку "{error}"')
-    if response.status_code != HTTPStatus.OK:
+        logger.error('SESSION.get вернул ошибку: %s', error)
+        raise CheckStatusEndpoint(
+            f'Эндпоинт недоступен: {type(error).__name__}')
+    if response.status_code == 304 and headers:
+        return {
+            'homeworks': [],
+            'current_date': last_api_answer['current_date']
+        }
+    if response.status_code != 200:
         message_error = (f'Недоступность эндпоига, '
                          f'статус кода: {response.status_code}')
         raise CheckStatusEndpoint(message_error)
     try:
-        check_response = response.json()
-    except AttributeError:
+        check_response = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
         raise CheckStatusEndpoint('Cервер вернул тело не в json формате')
+    last_api_answer.clear()
+    etag = response.headers.get('ETag')
+    if etag and isinstance(check_response, dict):
+        last_api_answer.update(
+            from_date=timestamp,
+            etag=etag,
+            current_date=check_response.get('current_date', timestamp)
+        )
     return check_response
 
 
@@ -84,53 +138,126 @@ def check_response(
     if not isinstance(response, dict):
         message_error = 'API не корректен, response не является словарем'
         raise TypeError(message_error)
-    if 'homeworks' not in response:
+    homeworks = response.get('homeworks')
+    if homeworks is None:
         message_error = 'API не корректен, в response отсутствует homeworks'
         raise CheckHomeworksInResponse(message_error)
-    if not isinstance(response.get('homeworks'), list):
+    if not isinstance(homeworks, list):
         message_error = 'API не корректен, response вернул не список'
         raise CheckHomeworksInResponse(message_error)
-    return response.get('homeworks')
+    return homeworks
 
 
 def parse_status(homework: Dict[str, Union[str, int]]) -> str:
     """информации о конкретной домашней работе, статус этой работы."""
-    if 'homework_name' not in homework:
-        message_error = ('Ошибка проверка статуса домашней работы, '
-                         'отсутствует искомый ключ "homework_name"')
-        raise KeyError(message_error)
-    if 'status' not in homework:
-        message_error = ('Ошибка проверка статуса домашней работы, '
-                         'отсутствует искомый ключ "status"')
+    try:
+        homework_name = homework['homework_name']
+        homework_status = homework['status']
+    except KeyError as error:
+        message_error = (f'Ошибка проверка статуса домашней работы, '
+                         f'отсутствует искомый ключ {error}')
         raise KeyError(message_error)
-    homework_name = homework['homework_name']
-    homework_status = homework['status']
     if homework_status not in HOMEWORK_STATUSES:
         message_error = (f'Ошибка проверка статуса домашней работы, '
                          f'недокументированный статус: {homework_status}')
         raise CheckHomeworkStatus(message_error)
-    if homework_name not in status_all_homeworks:
-        status_all_homeworks[homework_name] = homework_status
-        verdict = HOMEWORK_STATUSES[homework_status]
-        return (f'Изменился статус проверки работы '
-                f'"{homework_name}". {verdict}')
-    if homework_status != status_all_homeworks[homework_name]:
-        status_all_homeworks[homework_name] = homework_status
-        verdict = HOMEWORK_STATUSES[homework_status]
-        return (f'Изменился статус проверки работы '
-                f'"{homework_name}". {verdict}')
-    message = (f'Cтатус домашней "{homework_name}" '
-               f'работы, не изменился')
-    logger.debug(message)
-
-
-def send_message(bot: telegram.Bot, message: str) -> None:
-    """Отправляет сообщение в Telegram чат."""
+    return VERDICT_TEMPLATES[homework_status].format(name=homework_name)
+
+
+def send_message(bot: telegram.Bot, message: str) -> bool:
+    """Отправляет сообщение в Telegram чат, возвращает признак успеха."""
     try:
         bot.send_message(TELEGRAM_CHAT_ID, message)
-        logger.info(f'Сообщение успешно отправлено в Telegram: {message}')
+        logger.info('Сообщение успешно отправлено в Telegram: %s', message)
     except Exception as error:
-        logger.error(f'Сбой при отправке сообщения в Telegram: {error}')
+        logger.error('Сбой при отправке сообщения в Telegram: %s', error)
+        return False
+    return True
+
+
+def send_error_message(bot: telegram.Bot, message: str) -> None:
+    """Отправляет сообщение об ошибке в Telegram чат.
+    Повторное сообщение в течение MESSAGE_CACHE_TIME не отправляется.
+    """
+    message_hash = hash(message)
+    sent_time = sent_error_messages.get(message_hash)
+    if sent_time is not None and time.time() - sent_time < MESSAGE_CACHE_TIME:
+        logger.debug('Сообщение уже отправлялось в Telegram: %s', message)
+        return
+    if not send_message(bot, message):
+        return
+    sent_error_messages.pop(message_hash, None)
+    if len(sent_error_messages) >= MESSAGE_CACHE_SIZE:
+        sent_error_messages.popitem(last=False)
+    sent_error_messages[message_hash] = time.time()
+
+
+def chunk_messages(messages: List[str]) -> List[List[str]]:
+    """Группирует сообщения в блоки не длиннее MESSAGE_MAX_LENGTH."""
+    chunks = []
+    chunk_length = 0
+    for message in messages:
+        length = chunk_length + len(MESSAGE_SEPARATOR) + len(message)
+        if chunks and length <= MESSAGE_MAX_LENGTH:
+            chunks[-1].append(message)
+            chunk_length = length
+        else:
+            chunks.append([message])
+            chunk_length = len(message)
+    return chunks
+
+
+def join_messages(messages: List[str]) -> List[str]:
+    """Объединяет сообщения в блоки не длиннее MESSAGE_MAX_LENGTH."""
+    return [
+        MESSAGE_SEPARATOR.join(chunk) for chunk in chunk_messages(messages)
+    ]
+
+
+def send_homework_statuses(
+    bot: telegram.Bot,
+    homeworks: List[Dict[str, Union[str, int]]],
+    homework_statuses: Dict[str, str]
+) -> bool:
+    """Отправляет изменившиеся статусы домашних работ.
+    Статусы запоминаются в homework_statuses только после успешной
+    отправки их блока, возвращает признак успеха. Об ошибке в отдельной
+    работе сообщается отдельно, остальные статусы отправляются.
+    """
+    changed_homeworks = [
+        homework for homework in homeworks
+        if (homework.get('homework_name'), homework.get('status'))
+        not in homework_statuses.items()
+    ]
+    if not changed_homeworks:
+        logger.debug('Статусы домашних работ не изменились')
+        return True
+    messages = []
+    parsed_homeworks = []
+    for homework_dict in changed_homeworks:
+        try:
+            messages.append(parse_status(homework_dict))
+        except (KeyError, CheckHomeworkStatus) as error:
+            message = f'Сбой в работе программы: {error}'
+            logger.error(message)
+            send_error_message(bot, message)
+        else:
+            parsed_homeworks.append(homework_dict)
+    position = 0
+    for chunk in chunk_messages(messages):
+        if not send_message(bot, MESSAGE_SEPARATOR.join(chunk)):
+            return False
+        for homework_dict in parsed_homeworks[position:position + len(chunk)]:
+            homework_name = homework_dict['homework_name']
+            homework_statuses[homework_name] = homework_dict['status']
+        position += len(chunk)
+    return True
+
+
+def get_retry_time(error_streak: int) -> float:
+    """Время ожидания перед повтором запроса после серии ошибок."""
+    retry_time = min(RETRY_TIME * 2 ** error_streak, MAX_RETRY_TIME)
+    return retry_time + random.uniform(0, retry_time * RETRY_JITTER)
 
 
 def main() -> None:
@@ -141,24 +268,28 @@ def main() -> None:
         sys.exit()
     bot = telegram.Bot(token=TELEGRAM_TOKEN)
     current_timestamp = int(time.time())
-    chek_send_message_error = False
+    error_streak = 0
+    homework_statuses = {}
     while True:
         try:
             response = get_api_answer(current_timestamp)
             homeworks_list = check_response(response)
-            for homework_dict in homeworks_list:
-                verdict_status = parse_status(homework_dict)
-                if verdict_status is not None:
-                    send_message(bot, verdict_status)
+            delivered = send_homework_statuses(
+                bot, homeworks_list, homework_statuses)
+            if not delivered:
+                last_api_answer.clear()
+            elif homeworks_list:
+                current_timestamp = response.get(
+                    'current_date', int(time.time()))
         except Exception as error:
             message = f'Сбой в работе программы: {error}'
             logger.error(message)
-            if not chek_send_message_error:
-                send_message(bot, message)
-                chek_send_message_error = True
-        finally:
+            send_error_message(bot, message)
+            time.sleep(get_retry_time(error_streak))
+            error_streak += 1
+        else:
+            error_streak = 0
             time.sleep(RETRY_TIME)
-            current_timestamp = int(time.time())
 
 
 if __name__ == '__main__':
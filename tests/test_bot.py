@@ -1,8 +1,13 @@
+import io
+import json
 import os
+from collections import OrderedDict
 from http import HTTPStatus
+from http.client import HTTPResponse
 
 import requests
 import telegram
+import urllib3
 import utils
 
 
@@ -18,15 +23,14 @@ class MockResponseGET:
             'Проверьте, что вы делаете запрос на правильный '
             'ресурс API для запроса статуса домашней работы'
         )
-        assert 'headers' in kwargs, (
-            'Проверьте, что вы передали заголовки `headers` для запроса '
-            'статуса домашней работы'
-        )
-        assert 'Authorization' in kwargs['headers'], (
-            'Проверьте, что в параметры `headers` для запроса статуса '
+        import homework
+
+        headers = {**homework.SESSION.headers, **kwargs.get('headers', {})}
+        assert 'Authorization' in headers, (
+            'Проверьте, что в заголовки `headers` сессии для запроса статуса '
             'домашней работы добавили Authorization'
         )
-        assert kwargs['headers']['Authorization'].startswith('OAuth '), (
+        assert headers['Authorization'].startswith('OAuth '), (
             'Проверьте, что в параметрах `headers` для запроса статуса '
             'домашней работы Authorization начинается с OAuth'
         )
@@ -44,6 +48,11 @@ class MockResponseGET:
         )
         self.random_timestamp = random_timestamp
         self.status_code = http_status
+        self.headers = {}
+
+    @property
+    def content(self):
+        return json.dumps(self.json()).encode()
 
     def json(self):
         data = {
@@ -73,6 +82,90 @@ class MockTelegramBot:
         return self.random_timestamp
 
 
+class MockSocket:
+
+    def __init__(self, data):
+        self.file = io.BytesIO(data)
+
+    def makefile(self, *args, **kwargs):
+        return self.file
+
+
+def make_http_response(status, body=b''):
+    data = (
+        f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'
+    ).encode() + body
+    response = HTTPResponse(MockSocket(data))
+    response.begin()
+    return response
+
+
+class StopPolling(BaseException):
+    pass
+
+
+class MockPollResponse:
+
+    def __init__(self, data, status_code=HTTPStatus.OK, etag=None):
+        self.status_code = status_code
+        self.content = json.dumps(data).encode()
+        self.headers = {'ETag': etag} if etag else {}
+
+
+def run_main(monkeypatch, homework, answers, send_results=(), etag=None):
+    """
+    Runs homework.main() over a sequence of API answers.
+    :param answers: API response bodies, HTTP status codes or exceptions
+    :param send_results: results of the first Telegram sends, True if absent
+    :param etag: ETag of every answer, If-None-Match with it gets 304
+    :return: sent messages and from_date of every API request
+    """
+    answers = iter(answers)
+    send_results = iter(send_results)
+    sent = []
+    from_dates = []
+
+    def mock_response_get(url, params=None, **kwargs):
+        from_dates.append(params['from_date'])
+        try:
+            answer = next(answers)
+        except StopIteration:
+            raise StopPolling
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, int):
+            return MockPollResponse({}, status_code=answer)
+        if etag and kwargs['headers'].get('If-None-Match') == etag:
+            return MockPollResponse(
+                {}, status_code=HTTPStatus.NOT_MODIFIED, etag=etag)
+        return MockPollResponse(answer, etag=etag)
+
+    class MockPollingBot:
+
+        def __init__(self, token=None, **kwargs):
+            pass
+
+        def send_message(self, chat_id=None, text=None, **kwargs):
+            if not next(send_results, True):
+                raise telegram.error.NetworkError('Сбой сети')
+            sent.append(text)
+
+    monkeypatch.setattr(homework, 'PRACTICUM_TOKEN', 'sometoken')
+    monkeypatch.setattr(homework, 'TELEGRAM_TOKEN', '1234:abcdefg')
+    monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 12345)
+    monkeypatch.setattr(homework, 'last_api_answer', {})
+    monkeypatch.setattr(homework, 'sent_error_messages', OrderedDict())
+    monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+    monkeypatch.setattr(homework.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(telegram, 'Bot', MockPollingBot)
+    try:
+        homework.main()
+    except StopPolling:
+        pass
+    return sent, from_dates
+
+
 class TestHomework:
     HOMEWORK_STATUSES = {
         'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -186,10 +279,10 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'get_api_answer'
         utils.check_function(homework, func_name, 1)
 
@@ -215,6 +308,103 @@ class TestHomework:
             'ключа `current_date`'
         )
 
+    def test_get_api_answer_not_modified(self, monkeypatch, random_timestamp,
+                                         current_timestamp, api_url):
+        etag = f'"{random_timestamp}"'
+
+        def mock_response_get(*args, **kwargs):
+            if kwargs['headers'].get('If-None-Match') == etag:
+                http_status = HTTPStatus.NOT_MODIFIED
+            else:
+                http_status = HTTPStatus.OK
+            response = MockResponseGET(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=current_timestamp,
+                http_status=http_status, **kwargs
+            )
+            response.headers = {'ETag': etag}
+
+            def valid_response_json():
+                data = {
+                    "homeworks": [
+                        {
+                            'homework_name': 'hw123',
+                            'status': 'approved'
+                        }
+                    ],
+                    "current_date": random_timestamp
+                }
+                return data
+
+            response.json = valid_response_json
+            return response
+
+        import homework
+
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+        monkeypatch.setattr(homework, 'last_api_answer', {})
+
+        func_name = 'get_api_answer'
+        result = homework.get_api_answer(current_timestamp)
+        assert result['homeworks'], (
+            f'Проверьте, что функция `{func_name}` возвращает '
+            'домашние работы из ответа API'
+        )
+        result = homework.get_api_answer(current_timestamp)
+        assert result == {
+            'homeworks': [], 'current_date': random_timestamp
+        }, (
+            f'Проверьте, что функция `{func_name}` при ответе 304 '
+            'возвращает пустой список домашних работ и прошлый `current_date`'
+        )
+
+    def test_session_retries_transient_errors(self, api_url):
+        import homework
+
+        retry = homework.SESSION.get_adapter(api_url).max_retries
+        assert retry.total, (
+            'Убедитесь, что сессия `SESSION` повторяет запросы '
+            'при временных ошибках API'
+        )
+        for status in (HTTPStatus.TOO_MANY_REQUESTS,
+                       HTTPStatus.SERVICE_UNAVAILABLE):
+            assert status in retry.status_forcelist, (
+                'Убедитесь, что сессия `SESSION` повторяет запросы '
+                f'при ответе API с кодом {status.value}'
+            )
+
+    def test_session_retries_service_unavailable(self, monkeypatch,
+                                                 random_timestamp,
+                                                 current_timestamp):
+        body = json.dumps(
+            {'homeworks': [], 'current_date': random_timestamp}).encode()
+        responses = [
+            make_http_response(HTTPStatus.SERVICE_UNAVAILABLE),
+            make_http_response(HTTPStatus.OK, body),
+        ]
+
+        def mock_make_request(self, conn, method, url, **kwargs):
+            return responses.pop(0)
+
+        monkeypatch.setattr(
+            urllib3.connectionpool.HTTPConnectionPool, '_make_request',
+            mock_make_request)
+
+        import homework
+
+        monkeypatch.setattr(homework, 'last_api_answer', {})
+
+        func_name = 'get_api_answer'
+        result = homework.get_api_answer(current_timestamp)
+        assert not responses, (
+            'Убедитесь, что сессия `SESSION` повторяет запрос '
+            'при ответе API с кодом 503'
+        )
+        assert result['current_date'] == random_timestamp, (
+            f'Убедитесь, что функция `{func_name}` возвращает ответ API, '
+            'полученный после повтора запроса'
+        )
+
     def test_get_500_api_answer(self, monkeypatch, random_timestamp,
                                 current_timestamp, api_url):
         def mock_500_response_get(*args, **kwargs):
@@ -232,10 +422,10 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_500_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_500_response_get)
+
         func_name = 'get_api_answer'
         try:
             homework.get_api_answer(current_timestamp)
@@ -247,6 +437,32 @@ class TestHomework:
                 'когда API возвращает код, отличный от 200'
             )
 
+    def test_get_api_answer_not_json(self, monkeypatch, random_timestamp,
+                                     current_timestamp, api_url):
+        class MockResponseNotJson(MockResponseGET):
+            content = b'<html></html>'
+
+        def mock_response_get(*args, **kwargs):
+            return MockResponseNotJson(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=current_timestamp, **kwargs
+            )
+
+        import homework
+
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
+        func_name = 'get_api_answer'
+        try:
+            homework.get_api_answer(current_timestamp)
+        except homework.CheckStatusEndpoint:
+            pass
+        else:
+            assert False, (
+                f'Убедитесь, что в функции `{func_name}` обрабатываете ситуацию, '
+                'когда API возвращает тело не в формате json'
+            )
+
     def test_parse_status(self, random_timestamp):
         test_data = {
             "id": 123,
@@ -315,10 +531,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         response = homework.get_api_answer(current_timestamp)
         status = homework.check_response(response)
@@ -352,10 +568,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'parse_status'
         response = homework.get_api_answer(current_timestamp)
         homeworks = homework.check_response(response)
@@ -400,10 +616,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'parse_status'
         response = homework.get_api_answer(current_timestamp)
         homeworks = homework.check_response(response)
@@ -448,10 +664,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'parse_status'
         response = homework.get_api_answer(current_timestamp)
         homeworks = homework.check_response(response)
@@ -484,10 +700,10 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_no_homeworks_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_no_homeworks_response_get)
+
         func_name = 'check_response'
         result = homework.get_api_answer(current_timestamp)
         try:
@@ -525,10 +741,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         response = homework.get_api_answer(current_timestamp)
         try:
@@ -565,10 +781,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         response = homework.get_api_answer(current_timestamp)
         try:
@@ -599,10 +815,10 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_empty_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_empty_response_get)
+
         func_name = 'check_response'
         result = homework.get_api_answer(current_timestamp)
         try:
@@ -626,10 +842,10 @@ class TestHomework:
             )
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework
 
+        monkeypatch.setattr(homework.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         try:
             homework.get_api_answer(current_timestamp)
@@ -640,3 +856,277 @@ class TestHomework:
                 f'Убедитесь, что в функции `{func_name}` обрабатываете ситуацию, '
                 'когда API возвращает код, отличный от 200'
             )
+
+    def test_get_retry_time(self):
+        import homework
+
+        func_name = 'get_retry_time'
+        utils.check_function(homework, func_name, 1)
+
+        jitter = 1 + homework.RETRY_JITTER
+        retry_time = homework.get_retry_time(0)
+        assert (
+            homework.RETRY_TIME <= retry_time <= homework.RETRY_TIME * jitter
+        ), (
+            f'Убедитесь, что функция `{func_name}` после первой ошибки '
+            'возвращает RETRY_TIME с учетом разброса'
+        )
+        retry_time = homework.get_retry_time(1)
+        assert (
+            homework.RETRY_TIME * 2
+            <= retry_time <= homework.RETRY_TIME * 2 * jitter
+        ), (
+            f'Убедитесь, что функция `{func_name}` увеличивает время '
+            'ожидания при повторных ошибках'
+        )
+        retry_time = homework.get_retry_time(100)
+        assert (
+            homework.MAX_RETRY_TIME
+            <= retry_time <= homework.MAX_RETRY_TIME * jitter
+        ), (
+            f'Убедитесь, что функция `{func_name}` ограничивает время '
+            'ожидания значением MAX_RETRY_TIME'
+        )
+
+    def test_send_error_message_dedup(self, monkeypatch, random_timestamp):
+        import homework
+
+        monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 12345)
+        monkeypatch.setattr(homework, 'sent_error_messages', OrderedDict())
+        bot = MockTelegramBot(token='1234:abcdefg', random_timestamp=random_timestamp)
+        sent = []
+
+        def mock_send_message(chat_id=None, text=None, **kwargs):
+            sent.append(text)
+
+        monkeypatch.setattr(bot, 'send_message', mock_send_message)
+
+        func_name = 'send_error_message'
+        utils.check_function(homework, func_name, 2)
+        message = f'Сбой {random_timestamp}'
+        homework.send_error_message(bot, message)
+        homework.send_error_message(bot, message)
+        assert sent == [message], (
+            f'Убедитесь, что функция `{func_name}` не отправляет '
+            'повторно то же сообщение об ошибке'
+        )
+        homework.send_error_message(bot, 'Другой сбой')
+        assert len(sent) == 2, (
+            f'Убедитесь, что функция `{func_name}` отправляет '
+            'новое сообщение об ошибке'
+        )
+
+    def test_send_error_message_cache_time(self, monkeypatch,
+                                           random_timestamp):
+        import homework
+
+        monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 12345)
+        monkeypatch.setattr(homework, 'sent_error_messages', OrderedDict())
+        now = [float(random_timestamp)]
+        monkeypatch.setattr(homework.time, 'time', lambda: now[0])
+        bot = MockTelegramBot(token='1234:abcdefg', random_timestamp=random_timestamp)
+        sent = []
+
+        def mock_send_message(chat_id=None, text=None, **kwargs):
+            sent.append(text)
+
+        monkeypatch.setattr(bot, 'send_message', mock_send_message)
+
+        func_name = 'send_error_message'
+        message = f'Сбой {random_timestamp}'
+        homework.send_error_message(bot, message)
+        now[0] += homework.MESSAGE_CACHE_TIME - 1
+        homework.send_error_message(bot, message)
+        assert sent == [message], (
+            f'Убедитесь, что функция `{func_name}` не отправляет то же '
+            'сообщение об ошибке в течение MESSAGE_CACHE_TIME'
+        )
+        now[0] += 1
+        homework.send_error_message(bot, message)
+        assert sent == [message, message], (
+            f'Убедитесь, что функция `{func_name}` снова отправляет '
+            'сообщение об ошибке по истечении MESSAGE_CACHE_TIME'
+        )
+
+    def test_main_sends_connection_error_once(self, monkeypatch):
+        import homework
+
+        errors = [
+            requests.ConnectionError(
+                f'<HTTPSConnection object at {address}>: Сбой соединения')
+            for address in ('0x7f0000000001', '0x7f0000000002')
+        ]
+        sent, _ = run_main(monkeypatch, homework, errors)
+        assert len(sent) == 1, (
+            'Убедитесь, что `main` не отправляет повторно сообщение '
+            'о той же ошибке соединения с API'
+        )
+
+    def test_send_message_no_dedup(self, monkeypatch, random_timestamp):
+        import homework
+
+        monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 12345)
+        bot = MockTelegramBot(token='1234:abcdefg', random_timestamp=random_timestamp)
+        sent = []
+
+        def mock_send_message(chat_id=None, text=None, **kwargs):
+            sent.append(text)
+
+        monkeypatch.setattr(bot, 'send_message', mock_send_message)
+
+        func_name = 'send_message'
+        message = f'Сообщение {random_timestamp}'
+        homework.send_message(bot, message)
+        homework.send_message(bot, message)
+        assert sent == [message, message], (
+            f'Убедитесь, что функция `{func_name}` отправляет '
+            'каждое сообщение о статусе домашней работы'
+        )
+
+    def test_join_messages(self, monkeypatch):
+        import homework
+
+        func_name = 'join_messages'
+        utils.check_function(homework, func_name, 1)
+
+        messages = ['первое', 'второе']
+        result = homework.join_messages(messages)
+        assert result == [homework.MESSAGE_SEPARATOR.join(messages)], (
+            f'Убедитесь, что функция `{func_name}` объединяет '
+            'сообщения в одно'
+        )
+        assert homework.join_messages([]) == [], (
+            f'Убедитесь, что функция `{func_name}` возвращает пустой '
+            'список, если сообщений нет'
+        )
+        monkeypatch.setattr(homework, 'MESSAGE_MAX_LENGTH', 10)
+        result = homework.join_messages(messages)
+        assert result == messages, (
+            f'Убедитесь, что функция `{func_name}` разбивает сообщения '
+            'на части не длиннее MESSAGE_MAX_LENGTH'
+        )
+
+    def test_main_sends_only_changed_statuses(self, monkeypatch):
+        import homework
+
+        answers = [
+            {'homeworks': [{'homework_name': 'hw1', 'status': 'reviewing'}],
+             'current_date': 100},
+            {'homeworks': [{'homework_name': 'hw1', 'status': 'reviewing'},
+                           {'homework_name': 'hw2', 'status': 'approved'}],
+             'current_date': 200},
+            {'homeworks': [{'homework_name': 'hw1', 'status': 'rejected'}],
+             'current_date': 300},
+            {'homeworks': [{'homework_name': 'hw1', 'status': 'reviewing'}],
+             'current_date': 400},
+        ]
+        sent, _ = run_main(monkeypatch, homework, answers)
+        expected = [
+            homework.parse_status({'homework_name': name, 'status': status})
+            for name, status in [('hw1', 'reviewing'), ('hw2', 'approved'),
+                                 ('hw1', 'rejected'), ('hw1', 'reviewing')]
+        ]
+        assert sent == expected, (
+            'Убедитесь, что `main` отправляет сообщение только при '
+            'изменении статуса домашней работы'
+        )
+
+    def test_main_resends_status_after_failed_send(self, monkeypatch):
+        import homework
+
+        answer = {
+            'homeworks': [{'homework_name': 'hw1', 'status': 'approved'}],
+            'current_date': 100
+        }
+        sent, from_dates = run_main(
+            monkeypatch, homework, [answer, answer], send_results=[False])
+        message = homework.parse_status(answer['homeworks'][0])
+        assert sent == [message], (
+            'Убедитесь, что `main` повторно отправляет статус домашней '
+            'работы, если отправка сообщения не удалась'
+        )
+        assert from_dates[0] == from_dates[1], (
+            'Убедитесь, что `main` не сдвигает `from_date`, если '
+            'сообщение о статусе не было доставлено'
+        )
+
+    def test_main_resends_status_after_failed_send_with_etag(
+            self, monkeypatch):
+        import homework
+
+        answer = {
+            'homeworks': [{'homework_name': 'hw1', 'status': 'approved'}],
+            'current_date': 100
+        }
+        sent, _ = run_main(
+            monkeypatch, homework, [answer, answer, answer],
+            send_results=[False], etag='"hw1-approved"')
+        message = homework.parse_status(answer['homeworks'][0])
+        assert sent == [message], (
+            'Убедитесь, что `main` не отправляет If-None-Match после '
+            'неудачной отправки сообщения и повторно отправляет статус'
+        )
+
+    def test_main_resends_only_failed_chunks(self, monkeypatch):
+        import homework
+
+        monkeypatch.setattr(homework, 'MESSAGE_MAX_LENGTH', 10)
+        answer = {
+            'homeworks': [{'homework_name': 'hw1', 'status': 'approved'},
+                          {'homework_name': 'hw2', 'status': 'rejected'},
+                          {'homework_name': 'hw3', 'status': 'reviewing'}],
+            'current_date': 100
+        }
+        sent, _ = run_main(
+            monkeypatch, homework, [answer, answer],
+            send_results=[True, False])
+        expected = [
+            homework.parse_status(homework_dict)
+            for homework_dict in answer['homeworks']
+        ]
+        assert sent == expected, (
+            'Убедитесь, что `main` прекращает отправку после сбоя и '
+            'повторно отправляет только недоставленные статусы'
+        )
+
+    def test_main_sends_valid_statuses_with_invalid_one(self, monkeypatch):
+        import homework
+
+        answers = [
+            {'homeworks': [{'homework_name': 'hw1', 'status': 'approved'},
+                           {'homework_name': 'hw2', 'status': 'unknown'}],
+             'current_date': 100},
+        ]
+        sent, _ = run_main(monkeypatch, homework, answers)
+        message = homework.parse_status(answers[0]['homeworks'][0])
+        assert message in sent, (
+            'Убедитесь, что `main` отправляет корректные статусы, даже если '
+            'у другой домашней работы недокументированный статус'
+        )
+        assert any('unknown' in text for text in sent), (
+            'Убедитесь, что `main` сообщает о домашней работе '
+            'с недокументированным статусом'
+        )
+
+    def test_main_keeps_from_date_after_error(self, monkeypatch):
+        import homework
+
+        answer = {
+            'homeworks': [{'homework_name': 'hw1', 'status': 'approved'}],
+            'current_date': 100
+        }
+        sent, from_dates = run_main(
+            monkeypatch, homework,
+            [HTTPStatus.INTERNAL_SERVER_ERROR, answer, answer])
+        assert from_dates[0] == from_dates[1], (
+            'Убедитесь, что `main` не сдвигает `from_date` после ошибки '
+            'запроса к API'
+        )
+        assert from_dates[2] == answer['current_date'], (
+            'Убедитесь, что `main` использует `current_date` из ответа API '
+            'как `from_date` следующего запроса'
+        )
+        assert homework.parse_status(answer['homeworks'][0]) in sent, (
+            'Убедитесь, что `main` отправляет статус, изменившийся '
+            'во время сбоя API'
+        )